@@ -0,0 +1,57 @@
+"""Compare the startup latency of jobs run by a `ForkServer` against starting
+`cli.py` from cold for every job.
+
+Usage: python bench_forkserver.py [number of jobs]
+
+For cold starts the latency is the wall-clock time of a whole `cli.py` run,
+which is almost all startup for the small script used here. For the fork
+server it is the time from submitting a job until its script begins to run,
+and the total time until its result is ready is also shown. Jobs are run
+one at a time in both cases, so that they do not compete with each other."""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from forkserver import ForkServer
+
+SCRIPT = """\
+(def x (* 6 7))
+(+ x (reduce * (range 1 10)))
+"""
+
+def summarize(name: str, latencies) -> None:
+    print(f'{name:>12}: median {statistics.median(latencies) * 1e3:8.2f} ms,'
+        f' min {min(latencies) * 1e3:8.2f} ms,'
+        f' max {max(latencies) * 1e3:8.2f} ms')
+
+def main() -> None:
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    cli = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cli.py')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'job.lisp')
+
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(SCRIPT)
+
+        cold = []
+
+        for _ in range(jobs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, cli, filename], check=True,
+                stdout=subprocess.DEVNULL)
+            cold.append(time.perf_counter() - start)
+
+        server = ForkServer(max_workers=1)
+        results = list(server.run([filename] * jobs))
+        assert all(result.error is None for result in results)
+
+    print(f'{jobs} jobs')
+    summarize('cold cli.py', cold)
+    summarize('fork server', [result.startup for result in results])
+    summarize('fork total', [result.elapsed for result in results])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Compare evaluating forms of increasing size with the tree-walking
+`Interpreter` against compiling them and running them on the `Machine`.
+
+For each size this reports the time to interpret the form, to compile it, and
+to execute instructions that were compiled beforehand, followed by the number
+of runs of the same instructions after which compiling pays for itself. The
+`compile+exec` column is the cost of evaluating a form once with the compiler,
+so the crossover for one-shot evaluation is the first size at which it beats
+`interpret`.
+
+Usage: python bench_interpreter.py [max size in nodes]"""
+import io
+import sys
+import timeit
+from scanner import Scanner
+from evaluator import eval_lexemes
+from parser_ import Parser
+from compiler import compile_
+from machine import Machine
+from interpreter import Interpreter, expr_size
+
+def make_source(size: int) -> str:
+    """Make a nested arithmetic form with roughly `size` nodes."""
+    source = '1'
+
+    for i in range(max(1, size // 7)):
+        source = f'(+ {source} (* {i} 2))' if i % 2 else f'(- {source} {i})'
+
+    return source
+
+def parse(source: str):
+    parser = Parser()
+    parser.parse(eval_lexemes(Scanner().scan('<bench>', io.StringIO(source))))
+    return parser.end()
+
+def time_per_run(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+def main() -> None:
+    max_size = int(sys.argv[1]) if len(sys.argv) > 1 else 4096
+    machine = Machine()
+    interpreter = Interpreter(machine)
+    crossover = None
+    size = 8
+    print(f'{"nodes":>6} {"interpret":>11} {"compile":>11} {"exec":>11}'
+        f' {"compile+exec":>13} {"break-even":>11}')
+
+    while size <= max_size:
+        expr = parse(make_source(size))
+        nodes = expr_size(expr, sys.maxsize)
+        instructions = list(compile_(expr))
+        number = max(1, 20000 // nodes)
+        interpreted = time_per_run(lambda: interpreter.interpret(expr), number)
+        compiled = time_per_run(lambda: list(compile_(expr)), number)
+        executed = time_per_run(lambda: machine.exec_(instructions), number)
+
+        if executed < interpreted:
+            break_even = f'{compiled / (interpreted - executed):.1f} runs'
+        else:
+            break_even = 'never'
+
+        print(f'{nodes:>6} {interpreted * 1e6:>9.1f}us {compiled * 1e6:>9.1f}us'
+            f' {executed * 1e6:>9.1f}us {(compiled + executed) * 1e6:>11.1f}us'
+            f' {break_even:>11}')
+
+        if crossover is None and compiled + executed < interpreted:
+            crossover = nodes
+
+        size *= 2
+
+    if crossover is None:
+        print('the interpreter was faster for one-shot evaluation at every'
+            ' size')
+    else:
+        print(f'compiling was faster for one-shot evaluation from {crossover}'
+            ' nodes')
+
+if __name__ == '__main__':
+    main()
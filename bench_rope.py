@@ -0,0 +1,77 @@
+"""Compare building large strings by repeated concatenation of plain Python
+strings against building them as ropes with the `concat` builtin.
+
+Usage: python bench_rope.py [max size in MB]
+
+The strings are kept in an environment as they are built, as they would be by
+`def`, so that CPython cannot extend a plain string in place.
+
+The last two columns time operations on a rope built from many short
+appends, without flattening it: a search through a slice of its middle, and
+100 short slices and searches at its front, which have to reach its first
+leaf each time."""
+import sys
+import time
+from rope import rope_concat, rope_find, rope_slice
+
+CHUNK = 'the quick brown fox jumps over the lazy dog. ' * 3
+SHORT_CHUNK = 'jumps over'
+
+def build_plain(size: int) -> str:
+    env = {'s': ''}
+
+    while len(env['s']) < size:
+        env['s'] = env['s'] + CHUNK
+
+    return env['s']
+
+def build_rope(size: int) -> str:
+    env = {'s': ''}
+
+    while len(env['s']) < size:
+        env['s'] = rope_concat(env['s'], CHUNK)
+
+    return str(env['s'])
+
+def main() -> None:
+    max_size = int(float(sys.argv[1]) * 2**20) if len(sys.argv) > 1 else 2**22
+    size = 2**20
+    print(f'{"size":>6} {"plain":>10} {"rope":>10} {"slice+find":>11}'
+        f' {"front x100":>11}')
+
+    while size <= max_size:
+        start = time.perf_counter()
+        plain = build_plain(size)
+        plain_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        built = build_rope(size)
+        rope_time = time.perf_counter() - start
+        assert built == plain
+
+        env = {'s': CHUNK}
+
+        while len(env['s']) < size:
+            env['s'] = rope_concat(env['s'], SHORT_CHUNK)
+
+        rope = env['s']
+
+        start = time.perf_counter()
+        middle = rope_slice(rope, len(rope) // 4, -len(rope) // 4)
+        rope_find(middle, 'not there')
+        search_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+
+        for _ in range(100):
+            rope_slice(rope, 0, 10)
+            rope_find(rope, 'quick')
+
+        front_time = time.perf_counter() - start
+
+        print(f'{size // 2**20:>4}MB {plain_time:>9.3f}s {rope_time:>9.3f}s'
+            f' {search_time:>10.3f}s {front_time:>10.3f}s')
+        size *= 2
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Compare the throughput and peak memory use of scanning a large source file
+through `Scanner.scan` on a text stream against `scan_mapped_file`.
+
+Usage: python bench_scanner.py [size in MB]
+
+Each path is run in a fresh subprocess so that its peak RSS can be measured
+independently. Note that the pages of a memory-mapped file count towards the
+RSS while they are resident, although the kernel can drop them at any time."""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from scanner import Scanner, scan_mapped_file
+
+SAMPLE = """\
+; A sample of typical source code.
+(def greeting "hello, world\\n")
+(def total (+ 1 2 3 (* 4 5) 16#ff 3.25))
+;: a block comment ;: nested :; :;
+(exit (- total 1))
+"""
+
+def write_sample(filename: str, size: int) -> None:
+    with open(filename, 'w', encoding='utf-8') as f:
+        for _ in range(size // len(SAMPLE.encode('utf-8')) + 1):
+            f.write(SAMPLE)
+
+def scan_text(filename: str) -> int:
+    with open(filename, encoding='utf-8') as f:
+        return sum(1 for _ in Scanner().scan(filename, f))
+
+def scan_mapped(filename: str) -> int:
+    return sum(1 for _ in scan_mapped_file(filename))
+
+def child(mode: str, filename: str) -> None:
+    scan = scan_text if mode == 'text' else scan_mapped
+    start = time.perf_counter()
+    count = scan(filename)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    if sys.platform == 'darwin':
+        peak //= 1024
+
+    print(count, elapsed, peak)
+
+def main() -> None:
+    size = int(float(sys.argv[1]) * 2**20) if len(sys.argv) > 1 else 2**24
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'sample.lisp')
+        write_sample(filename, size)
+        megabytes = os.path.getsize(filename) / 2**20
+        print(f'scanning {megabytes:.1f} MB')
+
+        for mode in ('text', 'mapped'):
+            output = subprocess.run(
+                [sys.executable, __file__, '--child', mode, filename],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            count, elapsed, peak = output.split()
+            print(
+                f'{mode:>6}: {count} tokens in {float(elapsed):.2f} s'
+                f' ({megabytes / float(elapsed):.2f} MB/s),'
+                f' peak RSS {int(peak) / 1024:.1f} MB'
+            )
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        child(sys.argv[2], sys.argv[3])
+    else:
+        main()
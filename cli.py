@@ -1,14 +1,23 @@
 import io
 import sys
+import typing as t
 from base import LispError
-from scanner import Scanner
+from scanner import Scanner, scan_mapped_file
 from evaluator import eval_lexemes
 from parser_ import Parser
-from compiler import compile_
+from compiler import CompileCache, compile_
 from machine import Machine
 
-if __name__ == '__main__':
+def run_file(machine: Machine, filename: str) -> t.List:
+    """Run a complete source file on a machine, returning the final value
+    stack."""
+    parser = Parser()
+    parser.parse(eval_lexemes(scan_mapped_file(filename)))
+    return machine.exec_(compile_(parser.end()))
+
+def repl() -> None:
     machine = Machine()
+    compile_cache = CompileCache()
 
     while True:
         print('>>>', end=' ', flush=True)
@@ -18,7 +27,7 @@ if __name__ == '__main__':
 
         while True:
             f = io.StringIO(sys.stdin.readline())
-            
+
             try:
                 tokens.extend(eval_lexemes(scanner.scan('<stdin>', f)))
             except LispError as error:
@@ -34,11 +43,23 @@ if __name__ == '__main__':
 
                 if len(parser.expr_stack) == 1:
                     try:
-                        print(machine.exec_(compile_(parser.end())))
+                        print(machine.exec_(compile_cache.compile_(parser.end())))
                     except LispError as error:
                         print(error.fullstr())
 
                     break
 
             print('...', end=' ', flush=True)
-            
\ No newline at end of file
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        machine = Machine()
+
+        for filename in sys.argv[1:]:
+            try:
+                print(run_file(machine, filename))
+            except LispError as error:
+                print(error.fullstr())
+                sys.exit(1)
+    else:
+        repl()
@@ -1,8 +1,10 @@
 import typing as t
+import threading
+from collections import OrderedDict
 from enum import Enum
 from base import Location, LispError
 from scanner import Symbol, Token
-from parser_ import Expr
+from parser_ import ComplexExpr, Expr
 
 # Compile the Lisp program into bytecode for a virtual stack machine.
 
@@ -49,6 +51,12 @@ from parser_ import Expr
 # APPLY FUNCTION ON TOP OF STACK TO NEXT 2 VALUES BELOW IT
 # APPLY FUNCTION ON TOP OF STACK TO VALUE BELOW IT
 
+class InlineCache:
+    """The inline cache of a single `push` of a symbol or `call` instruction.
+    It holds nothing itself: each machine keeps its own entry for it in
+    `Machine.inline_caches`, so that instructions shared between machines
+    never hold on to one machine's values."""
+
 class Operator(Enum):
     push = 0
     call = 1
@@ -97,7 +105,9 @@ def compile_expr(expr: Expr) -> t.Iterator[Instruction]:
         if isinstance(expr, Instruction):
             yield expr
         elif isinstance(expr, Token):
-            yield Instruction(Operator.push, location, [expr.content])
+            content = expr.content
+            cache = InlineCache() if isinstance(content, Symbol) else None
+            yield Instruction(Operator.push, location, [content, cache])
         elif not expr.subexprs:
             raise LispError(
                 'empty procedure call expression',
@@ -118,7 +128,7 @@ def compile_expr(expr: Expr) -> t.Iterator[Instruction]:
             expr_stack.append(Instruction(
                 Operator.call,
                 location,
-                [len(tail)]
+                [len(tail), InlineCache()]
             ))
             expr_stack.append(head)
             expr_stack.extend(reversed(tail))
@@ -126,3 +136,138 @@ def compile_expr(expr: Expr) -> t.Iterator[Instruction]:
 def compile_(expr: Expr) -> t.Iterator[Instruction]:
     for subexpr in expr.subexprs:
         yield from compile_expr(subexpr)
+
+def structural_key(expr: Expr) -> t.Tuple[t.Tuple, t.List[Location]]:
+    """Get a key for an expression which is equal for any two expressions
+    with the same structure and contents, whatever their locations, together
+    with the locations of its nodes in preorder. The key is a flat tuple
+    holding, for each node in preorder, its type and either its content or
+    its number of subexpressions, so building it takes a single walk."""
+    key = []
+    locations = []
+    stack = [expr]
+
+    while stack:
+        node = stack.pop()
+        locations.append(node.location)
+
+        if isinstance(node, ComplexExpr):
+            key.append(ComplexExpr)
+            key.append(len(node.subexprs))
+            stack.extend(reversed(node.subexprs))
+        else:
+            key.append(type(node.content))
+            key.append(node.content)
+
+    return tuple(key), locations
+
+def index_locations(expr: Expr) -> Expr:
+    """Copy an expression, replacing the location of each node with its
+    index in preorder. The copy is built by position in the preorder walk,
+    so it is correct even if the expression shares subtrees."""
+    preorder = []
+    stack = [expr]
+
+    while stack:
+        node = stack.pop()
+        preorder.append(node)
+
+        if isinstance(node, ComplexExpr):
+            stack.extend(reversed(node.subexprs))
+
+    # Visiting the nodes in reverse preorder leaves the copies of a node's
+    # subexpressions on top of the stack, first subexpression last.
+    for index in reversed(range(len(preorder))):
+        node = preorder[index]
+
+        if isinstance(node, ComplexExpr):
+            stack.append(ComplexExpr(index, tuple(
+                stack.pop() for _ in node.subexprs
+            )))
+        else:
+            stack.append(node._replace(location=index))
+
+    return stack.pop()
+
+# A cached form: its instructions with preorder indices for locations, and the
+# locations and instructions of its latest submission.
+CachedForm = t.Tuple[
+    t.List[Instruction], t.List[Location], t.List[Instruction]
+]
+
+class CompileCache:
+    """A cache of compiled top-level expressions, keyed on their
+    `structural_key`, with the least recently used evicted first once there
+    are more than `maxsize`.
+
+    The cached instructions record their locations as preorder indices into
+    the expression, which are replaced by the locations from the current
+    submission when they are used. The instructions made for the latest
+    submission of each expression are kept too, and returned as they are if
+    the next submission has the same locations, as when a line is entered
+    again at the REPL. The returned instructions must not be modified. Their
+    arguments, including the inline caches, are shared between submissions,
+    and may be shared between machines running in different threads.
+
+    An expression that isn't cached is compiled lazily, as by `compile_`, so
+    errors are raised in the same order and any instructions before a compile
+    error still run. It is only added to the cache once all of its
+    instructions have been consumed."""
+    maxsize: t.Optional[int]
+    entries: 'OrderedDict[t.Tuple, CachedForm]'
+    lock: threading.Lock
+
+    def __init__(self, maxsize: t.Optional[int] = 256) -> None:
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def compile_expr(self, expr: Expr) -> t.Iterator[Instruction]:
+        key, locations = structural_key(expr)
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is not None:
+                self.entries.move_to_end(key)
+
+        if entry is not None:
+            template, cached_locations, instructions = entry
+
+            if cached_locations != locations:
+                instructions = [
+                    Instruction(operator, locations[index], args)
+                    for operator, index, args in template
+                ]
+                self.store(key, (template, locations, instructions))
+
+            yield from instructions
+            return
+
+        template = []
+        instructions = []
+
+        try:
+            for operator, index, args in compile_expr(index_locations(expr)):
+                template.append(Instruction(operator, index, args))
+                instructions.append(
+                    Instruction(operator, locations[index], args)
+                )
+                yield instructions[-1]
+        except LispError as error:
+            error.location = locations[error.location]
+            raise
+
+        self.store(key, (template, locations, instructions))
+
+    def store(self, key: t.Tuple, form: CachedForm) -> None:
+        with self.lock:
+            self.entries[key] = form
+            self.entries.move_to_end(key)
+
+            if self.maxsize is not None and len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def compile_(self, expr: Expr) -> t.Iterator[Instruction]:
+        for subexpr in expr.subexprs:
+            yield from self.compile_expr(subexpr)
@@ -0,0 +1,175 @@
+"""Run batches of scripts in pre-forked workers.
+
+A `ForkServer` pays for importing the front end and building a `Machine` (and
+optionally running a prelude on it) once, in the parent process. Each
+submitted script is then run in a child created with `os.fork`, which starts
+with a copy-on-write copy of that machine, so definitions made by one script
+are never seen by another. This needs a platform with `os.fork`.
+
+Usage: python forkserver.py [-j WORKERS] [--prelude FILE] SCRIPT...
+"""
+import argparse
+import os
+import pickle
+import select
+import sys
+import time
+import traceback
+import typing as t
+from base import LispError
+from machine import Machine
+from cli import run_file
+
+class JobResult(t.NamedTuple('JobResult', [
+    ('filename', str),
+    ('values', t.List),
+    ('error', t.Optional[str]),
+    ('startup', float),
+    ('elapsed', float),
+])):
+    """The outcome of running a script in a worker. `values` holds the final
+    value stack, converted by the server's `serialize` function, and `error`
+    describes why the script failed, if it did. `startup` is the time from
+    submitting the job until the script began to run, and `elapsed` is the
+    time from submitting it until its result was ready, both in seconds."""
+
+Worker = t.NamedTuple('Worker', [
+    ('pid', int),
+    ('filename', str),
+    ('submitted', float),
+])
+
+class ForkServer:
+    """A server which runs each submitted script in a fresh child process,
+    forked from a parent holding a ready `machine`. At most `max_workers`
+    children run at once. The values left on the stack by a script are
+    passed through `serialize` in the child before being sent back, since
+    procedures and other values cannot always be pickled."""
+    machine: Machine
+    max_workers: int
+    serialize: t.Callable[[t.Any], t.Any]
+    workers: t.Dict[int, Worker]
+
+    def __init__(self, prelude: t.Optional[str] = None,
+    max_workers: t.Optional[int] = None,
+    serialize: t.Callable[[t.Any], t.Any] = repr) -> None:
+        self.machine = Machine()
+
+        if prelude is not None:
+            run_file(self.machine, prelude)
+
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.serialize = serialize
+        self.workers = {}
+
+    def submit(self, filename: str) -> None:
+        """Fork a worker to run a script. The caller must make sure that
+        fewer than `max_workers` are running."""
+        submitted = time.perf_counter()
+        read_fd, write_fd = os.pipe()
+
+        try:
+            pid = os.fork()
+        except OSError:
+            os.close(read_fd)
+            os.close(write_fd)
+            raise
+
+        if pid:
+            os.close(write_fd)
+            self.workers[read_fd] = Worker(pid, filename, submitted)
+            return
+
+        try:
+            os.close(read_fd)
+            result = self.run_job(filename, submitted)
+
+            try:
+                data = pickle.dumps(result)
+            except Exception:
+                data = pickle.dumps(result._replace(
+                    values=[],
+                    error=traceback.format_exc(),
+                ))
+
+            with os.fdopen(write_fd, 'wb') as f:
+                f.write(data)
+        finally:
+            os._exit(0)
+
+    def run_job(self, filename: str, submitted: float) -> JobResult:
+        """Run a script in the worker process."""
+        started = time.perf_counter()
+        values = []
+        error = None
+
+        try:
+            values = [self.serialize(value)
+                for value in run_file(self.machine, filename)]
+        except LispError as lisp_error:
+            error = lisp_error.fullstr()
+        except SystemExit as exit:
+            error = f'the script exited with status {exit.code!r}'
+        except Exception:
+            error = traceback.format_exc()
+
+        return JobResult(filename, values, error, started - submitted,
+            time.perf_counter() - submitted)
+
+    def collect(self) -> JobResult:
+        """Wait for any running worker to finish, and get its result."""
+        ready, _, _ = select.select(list(self.workers), [], [])
+        read_fd = ready[0]
+        worker = self.workers.pop(read_fd)
+
+        with os.fdopen(read_fd, 'rb') as f:
+            data = f.read()
+
+        os.waitpid(worker.pid, 0)
+
+        if data:
+            return pickle.loads(data)
+
+        elapsed = time.perf_counter() - worker.submitted
+        return JobResult(worker.filename, [],
+            'the worker exited without a result', elapsed, elapsed)
+
+    def run(self, filenames: t.Iterable[str]) -> t.Iterator[JobResult]:
+        """Run each script in its own worker, and yield the results in the
+        order in which the workers finish."""
+        for filename in filenames:
+            if len(self.workers) >= self.max_workers:
+                yield self.collect()
+
+            self.submit(filename)
+
+        while self.workers:
+            yield self.collect()
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(
+        description='Run scripts in pre-forked workers.'
+    )
+    arg_parser.add_argument('scripts', nargs='+', metavar='SCRIPT')
+    arg_parser.add_argument('-j', '--workers', type=int, default=None,
+        help='the maximum number of scripts to run at once')
+    arg_parser.add_argument('--prelude', default=None,
+        help='a script to run once in the parent before forking')
+    args = arg_parser.parse_args()
+    server = ForkServer(args.prelude, args.workers)
+    failed = False
+
+    for result in server.run(args.scripts):
+        print(f'{result.filename} (started after'
+            f' {result.startup * 1e3:.2f} ms):')
+
+        if result.error is None:
+            print(f'[{", ".join(result.values)}]')
+        else:
+            print(result.error)
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
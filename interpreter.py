@@ -1,88 +1,176 @@
-from typing import t
+import typing as t
+from base import Location, LispError
 from scanner import Symbol, Token
-import parser_
+from parser_ import ComplexExpr, Expr
+from compiler import CompileCache, compile_expr
+from machine import Machine
 
-Object = None
+# Evaluate Lisp programs by walking their expressions directly, without
+# compiling them first. The walk uses an explicit stack of pending work rather
+# than recursion, and a value stack that behaves exactly like the one in
+# `Machine.exec_`, so that the two backends are interchangeable.
 
-InterpreterDirective = t.NamedTuple('InterpreterDirective', [('content', str)])
-Instruction = t.Union[Token, InterpreterDirective]
+Call = t.NamedTuple('Call', [
+    ('location', Location),
+    ('arg_count', int),
+])
 
-def walk_expr(expr: parser_.Expr) -> t.Iterator[Instruction]:
-    stack = [subexpr]
+Define = t.NamedTuple('Define', [
+    ('location', Location),
+    ('symbol', Symbol),
+])
 
-    while stack:
-        expr = stack.pop()
-
-        if isinstance(expr, (parser_.Token, InterpreterDirective)):
-            yield expr
-        else:
-            stack.append(InterpreterDirective(')'))
-            stack.extend(reversed(expr.subexprs))
-            yield InterpreterDirective('(')
-
-class Call:
-    proc: t.Callable
-    env: t.ChainMap
-    args: t.List[Object]
-
-    def __init__(self, proc, env, args) -> None:
-        self.proc = proc
-        self.env = env
-        self.args = args
+Work = t.Union[Expr, Call, Define]
 
 class Interpreter:
-    stack: t.List
-
-    def __init__(self) -> None:
-        self.stack = []
-        self.env_stack = {}
-        self.value = None
-
-    def push(self, obj: Object) -> t.Optional[Object]:
-        try:
-            self.stack[-1].append(obj)
-        except IndexError:
-            return obj
-
-    def interpret_token(self, token: Token) -> Object:
-        if not isinstance(token, Symbol):
-            return token.content
-
-        try:
-            return self.stack[-1].env[token.content]
-        except KeyError:
-            raise LispError(f'undefined symbol {token.content}', token.location)
-
-    def interpret_expr(self, expr: Expr) -> Object:
-        self.stack.append(expr)
-
-        while self.stack:
-            instruction = self.stack.pop()
-
-            if isinstance(instruction, Token):
-                self.value = self.interpret_token(token)
-
-
-        if isinstance(expr, Token):
-            return self.interpret_token(expr)
-
-        while self.call_stack:
-            self.call_stack.extend()
-
-        for instruction in walk_expr(expr):
-            if isinstance(instruction, InterpreterDirective):
-                if instruction.content == '(':
-                    self.call_stack.append([])
-                elif instruction.content == ')':
-                    # pop stack frame
-                else:
-                    assert False, "The interpreter received an invalid "\
-                    "directive."
+    """A tree-walking evaluator which shares its environment with a
+    `Machine`."""
+    machine: Machine
+
+    def __init__(self, machine: Machine) -> None:
+        self.machine = machine
+
+    def interpret_expr(self, expr: Expr, stack: t.List) -> None:
+        """Evaluate an expression, leaving its value (if any) on the
+        stack."""
+        env = self.machine.env
+        work: t.List[Work] = [expr]
+
+        while work:
+            item = work.pop()
+
+            if isinstance(item, Token):
+                content = item.content
+
+                if not isinstance(content, Symbol):
+                    stack.append(content)
+                    continue
+
+                try:
+                    stack.append(env[content.content])
+                except KeyError:
+                    raise LispError(
+                        f'undefined symbol "{content.content}"',
+                        item.location
+                    ) from None
+            elif isinstance(item, ComplexExpr):
+                if not item.subexprs:
+                    raise LispError(
+                        'empty procedure call expression',
+                        item.location
+                    )
+
+                head = item.subexprs[0]
+                tail = item.subexprs[1:]
+
+                if (isinstance(head, Token) and isinstance(head.content, Symbol)
+                and head.content.content == 'def'):
+                    try:
+                        name_expr, value_expr = tail
+                    except ValueError:
+                        raise LispError(
+                            f'Invalid definition; got {len(tail)} arguments'
+                            ' but definitions must have exactly 2 arguments',
+                            item.location
+                        ) from None
+
+                    if not (isinstance(name_expr, Token)
+                    and isinstance(name_expr.content, Symbol)):
+                        raise LispError(
+                            'Invalid name in definition; it must be a symbol',
+                            name_expr.location
+                        )
+
+                    work.append(Define(item.location, name_expr.content))
+                    work.append(value_expr)
+                    continue
+
+                work.append(Call(item.location, len(tail)))
+                work.append(head)
+                work.extend(reversed(tail))
+            elif isinstance(item, Call):
+                proc = stack.pop()
+
+                if not callable(proc):
+                    raise LispError(
+                        f'head of procedure call expression is not a procedure',
+                        item.location
+                    )
+
+                assert item.arg_count <= len(stack), "The interpreter "\
+                "encountered a stack underflow."
+                args = stack[len(stack) - item.arg_count:]
+                del stack[len(stack) - item.arg_count:]
+                stack.append(proc(*args))
+            elif isinstance(item, Define):
+                assert stack, "The interpreter encountered a stack underflow."
+                self.machine.define(item.symbol.content, stack.pop())
+            else:
+                assert False, "The interpreter received an invalid work item."
+
+    def interpret(self, expr: ComplexExpr) -> t.List:
+        """Evaluate each expression in a program, returning the final value
+        stack like `Machine.exec_` does."""
+        stack = []
+
+        for subexpr in expr.subexprs:
+            self.interpret_expr(subexpr, stack)
+
+        return stack
+
+def expr_size(expr: Expr, limit: int) -> int:
+    """Count the nodes in an expression, stopping once `limit` is
+    reached."""
+    size = 0
+    stack = [expr]
+
+    while stack and size < limit:
+        node = stack.pop()
+        size += 1
+
+        if isinstance(node, ComplexExpr):
+            stack.extend(node.subexprs)
+
+    return size
+
+class AdaptiveEvaluator:
+    """An evaluator which walks forms smaller than `threshold` nodes directly
+    with an `Interpreter`, and compiles larger ones to run on the `Machine`,
+    through a `CompileCache` if one is given.
+
+    Since every instruction of a form runs exactly once, compiling only pays
+    for itself when the compiled form is reused, and `bench_interpreter.py`
+    found the interpreter faster for one-shot evaluation at every size. So by
+    default, with `threshold` set to `None`, every form is interpreted; a
+    threshold is worth setting when large forms are resubmitted to a compile
+    cache."""
+    machine: Machine
+    interpreter: Interpreter
+    compile_cache: t.Optional[CompileCache]
+    threshold: t.Optional[int]
+
+    def __init__(self, machine: Machine,
+    compile_cache: t.Optional[CompileCache] = None,
+    threshold: t.Optional[int] = None) -> None:
+        self.machine = machine
+        self.interpreter = Interpreter(machine)
+        self.compile_cache = compile_cache
+        self.threshold = threshold
+
+    def eval_(self, expr: ComplexExpr) -> t.List:
+        stack = []
+
+        for subexpr in expr.subexprs:
+            if (self.threshold is None
+            or expr_size(subexpr, self.threshold) < self.threshold):
+                self.interpreter.interpret_expr(subexpr, stack)
+                continue
+
+            if self.compile_cache is None:
+                instructions = compile_expr(subexpr)
             else:
-                # evaluate token + add to current stack frame
+                instructions = self.compile_cache.compile_expr(subexpr)
 
-    def interpret(expr: Expr) -> Object:
-        for subexpr in expr.subexprs[:-1]:
-            self.interpret_expr(subexpr)
+            stack.extend(self.machine.exec_(instructions))
 
-        return self.interpret_expr(expr.subexprs[-1])
+        return stack
@@ -1,25 +1,296 @@
 import typing as t
+from collections import ChainMap, OrderedDict
 from functools import reduce
 import operator
 import sys
+import threading
+from types import MappingProxyType
 from base import LispError
-from scanner import Symbol, Token
-from compiler import Instruction, Operator
+from compiler import InlineCache, Instruction, Operator
+from rope import (
+    rope_concat, rope_find, rope_length, rope_slice, rope_write_file,
+)
+from sequence import (
+    Sequence, expand_sequences, seq_filter, seq_lines, seq_map, seq_range, seq_reduce,
+    seq_take,
+)
 
 def product(iterable):
     return reduce(operator.mul, iterable, 1)
 
+# `+` and `*` add or multiply the elements of any sequence among their
+# arguments. Since a sequence supports no arithmetic, the arguments are first
+# combined directly, which is fastest when there are no sequences, and
+# sequences are only looked for if that fails.
+
+def add(*args):
+    try:
+        return sum(args)
+    except TypeError:
+        if not any(isinstance(arg, Sequence) for arg in args):
+            raise
+
+        return sum(expand_sequences(args))
+
+def multiply(*args):
+    try:
+        return product(args)
+    except TypeError:
+        if not any(isinstance(arg, Sequence) for arg in args):
+            raise
+
+        return product(expand_sequences(args))
+
+class MemoCache:
+    """The shared store behind every `Memo` of a machine. Entries are kept
+    in a single least-recently-used order, keyed on the memo and the
+    `memo_key` of its arguments, so that the global `maxsize` can be enforced across all
+    memoized procedures at once. Since memos in a shared base environment
+    are used by many machines at once, every access to the entries is made
+    while holding `lock`."""
+    maxsize: t.Optional[int]
+    entries: 'OrderedDict[t.Tuple[Memo, t.Tuple], t.Any]'
+    lock: threading.Lock
+
+    def __init__(self, maxsize: t.Optional[int] = None) -> None:
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def insert(self, memo: 'Memo', key: t.Tuple, result: t.Any) -> None:
+        """Add a result to the cache. The caller must hold `lock`."""
+        self.entries[memo, key] = result
+
+        if self.maxsize is not None:
+            while len(self.entries) > self.maxsize:
+                (evicted_memo, evicted_key), _ = self.entries.popitem(
+                    last=False
+                )
+                del evicted_memo.keys[evicted_key]
+
+    def clear(self) -> None:
+        with self.lock:
+            for memo, _ in self.entries:
+                memo.keys.clear()
+
+            self.entries.clear()
+
+    def memo(self, proc: t.Callable, maxsize: t.Optional[int] = None)\
+    -> 'Memo':
+        """Wrap a procedure so that its results are cached here. A memo is
+        returned as it is, unless a `maxsize` is given, in which case the
+        procedure it wraps is memoized afresh with that bound."""
+        if isinstance(proc, Memo):
+            if maxsize is None:
+                return proc
+
+            proc = proc.proc
+
+        return Memo(proc, self, maxsize)
+
+    def memo_clear(self, memo: t.Optional['Memo'] = None) -> None:
+        """Clear the cached results of one memoized procedure, or of all of
+        them if none is given."""
+        if memo is None:
+            self.clear()
+        elif isinstance(memo, Memo):
+            memo.clear()
+        else:
+            raise TypeError(
+                f'expected a memoized procedure, but {type(memo).__name__}'
+                ' found'
+            )
+
+def memo_key(args: t.Tuple) -> t.Tuple:
+    """Get the key under which a call's results are cached. Each argument is
+    paired with its type, as by `functools.lru_cache(typed=True)`, since
+    arguments such as `1` and `Fraction(1, 1)` are equal but give results of
+    different types."""
+    return tuple((type(arg), arg) for arg in args)
+
+class Memo:
+    """A pure procedure whose results are cached, keyed on the `memo_key` of
+    its arguments. Calls with unhashable arguments are passed straight
+    through. Each memo
+    keeps at most `maxsize` results of its own, evicting the least recently
+    used first."""
+    proc: t.Callable
+    cache: MemoCache
+    maxsize: t.Optional[int]
+    keys: 'OrderedDict[t.Tuple, None]'
+    hits: int
+    misses: int
+
+    def __init__(self, proc: t.Callable, cache: MemoCache,
+    maxsize: t.Optional[int] = None) -> None:
+        self.proc = proc
+        self.cache = cache
+        self.maxsize = maxsize
+        self.keys = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, *args):
+        key = memo_key(args)
+
+        with self.cache.lock:
+            try:
+                result = self.cache.entries[self, key]
+            except KeyError:
+                self.misses += 1
+            except TypeError:
+                pass
+            else:
+                self.hits += 1
+                self.cache.entries.move_to_end((self, key))
+                self.keys.move_to_end(key)
+                return result
+
+        # The procedure is called without holding the lock, so two threads
+        # may both compute the same result; the second simply replaces the
+        # first.
+        result = self.proc(*args)
+
+        try:
+            hash(key)
+        except TypeError:
+            return result
+
+        with self.cache.lock:
+            self.keys[key] = None
+            self.keys.move_to_end(key)
+            self.cache.insert(self, key, result)
+
+            if self.maxsize is not None:
+                while len(self.keys) > self.maxsize:
+                    evicted_key, _ = self.keys.popitem(last=False)
+                    del self.cache.entries[self, evicted_key]
+
+        return result
+
+    def clear(self) -> None:
+        with self.cache.lock:
+            for key in self.keys:
+                del self.cache.entries[self, key]
+
+            self.keys.clear()
+
+# A machine's table of inline cache entries is emptied once it holds this many,
+# so that entries for instructions that will never run again don't pile up
+# over a long session.
+INLINE_CACHE_MAXSIZE = 4096
+
+# The entry of a call site that has not yet seen a procedure. This can't be
+# `None`, since that is a value the head of a call can have.
+_EMPTY = object()
+
+BUILTINS = MappingProxyType({
+    '+': add,
+    '-': lambda x, y: x - y,
+    '*': multiply,
+    'exit': sys.exit,
+    'range': seq_range,
+    'map': seq_map,
+    'filter': seq_filter,
+    'take': seq_take,
+    'reduce': seq_reduce,
+    'lines': seq_lines,
+    'concat': rope_concat,
+    'slice': rope_slice,
+    'length': rope_length,
+    'find': rope_find,
+    'write-file': rope_write_file,
+})
+
 class Machine:
-    def __init__(self):
-        self.env = {
-            '+': lambda *args: sum(args),
-            '-': lambda x, y: x - y,
-            '*': lambda *args: product(args),
-            'exit': sys.exit,
-        }
+    """A virtual stack machine that executes compiled instructions.
+
+    Global lookups are served from inline caches. Each `push` of a symbol
+    and each `call` instruction carries an `InlineCache`, and the machine
+    keeps its entry for it in `inline_caches`: for a `push`, the environment
+    version and the value the symbol was resolved to, and for a `call`, the
+    last procedure verified to be callable there. A cached value is valid
+    only while `env_version` matches the version it was recorded under; `def`
+    bumps the version, so any code that rebinds names in `env` directly
+    should bump it too. The `cache_hits` and `cache_misses` counters can be
+    inspected for tuning. Since the entries live on the machine, instructions
+    shared through a `CompileCache` never keep a finished machine's values
+    alive, and machines sharing instructions don't evict each other's
+    entries.
+
+    Pure procedures can be memoized with the `memo` builtin, or by marking a
+    name in `env` with `mark_pure`. All memoized results share `memo_cache`,
+    whose size is bounded by `memo_maxsize`.
+
+    The environment is a copy-on-write overlay on an immutable `base`
+    environment, which can be shared between any number of machines: new
+    bindings only ever go into the machine's own overlay. A machine with a
+    standard environment already loaded can be turned into a base for others
+    with `freeze_env`. Separate machines can execute concurrently from
+    different threads, including on free-threaded builds of Python."""
+    env: t.ChainMap[str, t.Any]
+    env_version: int
+    cache_hits: int
+    cache_misses: int
+    inline_caches: t.Dict[InlineCache, t.Any]
+    memo_cache: MemoCache
+    lock: threading.Lock
+
+    def __init__(self, memo_maxsize: t.Optional[int] = None,
+    base: t.Mapping[str, t.Any] = BUILTINS):
+        self.env_version = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.inline_caches = {}
+        self.memo_cache = MemoCache(memo_maxsize)
+        self.lock = threading.Lock()
+        self.env = ChainMap({
+            'memo': self.memo_cache.memo,
+            'memo-clear': self.memo_cache.memo_clear,
+        }, base)
+
+    def freeze_env(self) -> t.Mapping[str, t.Any]:
+        """Get an immutable snapshot of the environment, to be used as the
+        base environment of other machines."""
+        return MappingProxyType(dict(self.env))
+
+    def memo(self, proc: t.Callable, maxsize: t.Optional[int] = None) -> Memo:
+        """Wrap a procedure so that its results are cached."""
+        return self.memo_cache.memo(proc, maxsize)
+
+    def memo_clear(self, memo: t.Optional[Memo] = None) -> None:
+        """Clear the cached results of one memoized procedure, or of all of
+        them if none is given."""
+        self.memo_cache.memo_clear(memo)
+
+    def mark_pure(self, name: str, maxsize: t.Optional[int] = None) -> None:
+        """Memoize the procedure bound to `name` in the environment."""
+        self.define(name, self.memo(self.env[name], maxsize))
+
+    def define(self, name: str, value: t.Any) -> None:
+        """Bind a name in the environment, as `def` does. Memoized results
+        of a procedure previously bound to the name in this machine's own
+        overlay are discarded."""
+        with self.lock:
+            old_value = self.env.maps[0].get(name)
+
+            if isinstance(old_value, Memo) and old_value is not value:
+                old_value.clear()
+
+            self.env[name] = value
+            self.env_version += 1
+
+    def set_inline_cache(self, cache: InlineCache, entry: t.Any) -> None:
+        """Record the entry for an inline cache, first emptying the table if
+        it is full."""
+        if len(self.inline_caches) >= INLINE_CACHE_MAXSIZE:
+            self.inline_caches.clear()
+
+        self.inline_caches[cache] = entry
 
     def exec_(self, instructions: t.Iterable[Instruction]):
         stack = []
+        inline_caches = self.inline_caches
 
         for instruction in instructions:
             operator = instruction.operator
@@ -27,30 +298,47 @@ class Machine:
             args = instruction.args
 
             if operator == Operator.push:
-                value, = args
+                value, cache = args
 
-                if not isinstance(value, Symbol):
+                if cache is None:
                     stack.append(value)
                     continue
 
+                entry = inline_caches.get(cache)
+
+                if entry is not None and entry[0] == self.env_version:
+                    self.cache_hits += 1
+                    stack.append(entry[1])
+                    continue
+
+                self.cache_misses += 1
+                version = self.env_version
                 content = value.content
 
                 try:
                     bound_value = self.env[content]
                 except KeyError:
                     raise LispError(f'undefined symbol "{content}"', location)
-                    
+
+                self.set_inline_cache(cache, (version, bound_value))
                 stack.append(bound_value)
             elif operator == Operator.call:
                 proc = stack.pop()
+                arg_count, cache = args
+
+                if inline_caches.get(cache, _EMPTY) is proc:
+                    self.cache_hits += 1
+                else:
+                    self.cache_misses += 1
+
+                    if not callable(proc):
+                        raise LispError(
+                            f'head of procedure call expression is not a procedure',
+                            location
+                        )
 
-                if not callable(proc):
-                    raise LispError(
-                        f'head of procedure call expression is not a procedure',
-                        location
-                    )
+                    self.set_inline_cache(cache, proc)
 
-                arg_count, = args
                 assert arg_count <= len(stack), "The virtual machine "\
                 "encountered a stack underflow."
                 args = [stack.pop() for _ in range(arg_count)]
@@ -60,8 +348,7 @@ class Machine:
                 symbol, = args
                 assert stack, "The virtual machine encountered a stack "\
                 "underflow."
-                value = stack.pop()
-                self.env[symbol.content] = value
+                self.define(symbol.content, stack.pop())
             else:
                 assert False, "The virtual machine encountered an invalid "\
                 "operator."
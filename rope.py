@@ -0,0 +1,253 @@
+import typing as t
+
+# Strings built up by the string builtins are represented as ropes: trees
+# whose leaves are Python strings, and whose inner nodes are concatenations
+# and slices of other ropes. Concatenating and slicing are constant-time and
+# copy no characters. A rope is only flattened into a single Python string when
+# it is printed or handed to Python code that needs a `str`, and the result is
+# kept, so that this happens at most once per rope.
+
+# Strings shorter than this are concatenated or sliced directly rather than
+# by creating a new node, since copying them is cheaper than the bookkeeping.
+SHORT_LENGTH = 64
+
+# Short strings appended to a rope are merged into its last leaf, as long as
+# that leaf stays within this length, so that building a string from many
+# small pieces doesn't make a node per piece.
+LEAF_LENGTH = 1024
+
+# A rope that grows deeper than this is rebalanced, so that reaching any part
+# of it takes a bounded number of steps.
+MAX_DEPTH = 48
+
+class Rope:
+    """A lazily flattened string. `flat` holds the flattened string once it
+    has been computed, and `depth` is the number of levels of nodes beneath
+    this one."""
+    length: int
+    depth: int
+    flat: t.Optional[str]
+
+    def chunks(self) -> t.Iterator[str]:
+        """Iterate over the pieces of the string in order, without flattening
+        it."""
+        return iter_chunks(self, 0, self.length)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __str__(self) -> str:
+        if self.flat is None:
+            self.flat = ''.join(self.chunks())
+
+        return self.flat
+
+    def __repr__(self) -> str:
+        return repr(str(self))
+
+    def __fspath__(self) -> str:
+        return str(self)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (Rope, str)):
+            return str(self) == str(other)
+
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(str(self))
+
+class Leaf(Rope):
+    def __init__(self, content: str) -> None:
+        self.length = len(content)
+        self.depth = 0
+        self.flat = content
+
+class Concat(Rope):
+    left: Rope
+    right: Rope
+
+    def __init__(self, left: Rope, right: Rope) -> None:
+        self.left = left
+        self.right = right
+        self.length = left.length + right.length
+        self.depth = 1 + max(left.depth, right.depth)
+        self.flat = None
+
+class Slice(Rope):
+    base: Rope
+    start: int
+    stop: int
+
+    def __init__(self, base: Rope, start: int, stop: int) -> None:
+        self.base = base
+        self.start = start
+        self.stop = stop
+        self.length = stop - start
+        self.depth = 1 + base.depth
+        self.flat = None
+
+def iter_chunks(rope: Rope, start: int, stop: int) -> t.Iterator[str]:
+    """Iterate over the pieces of the part of a rope between the given
+    indices. The tree is walked with an explicit stack, since ropes built by
+    repeated concatenation can be very deep."""
+    stack = [(rope, start, stop)]
+
+    while stack:
+        node, start, stop = stack.pop()
+
+        if start >= stop:
+            continue
+
+        if node.flat is not None:
+            yield node.flat[start:stop]
+        elif isinstance(node, Concat):
+            left_length = node.left.length
+            stack.append((
+                node.right,
+                max(start - left_length, 0),
+                stop - left_length,
+            ))
+            stack.append((node.left, start, min(stop, left_length)))
+        elif isinstance(node, Slice):
+            stack.append((node.base, node.start + start, node.start + stop))
+        else:
+            assert False, "The rope contains an invalid node."
+
+def as_rope(s: t.Union[Rope, str]) -> Rope:
+    if isinstance(s, Rope):
+        return s
+
+    if isinstance(s, str):
+        return Leaf(s)
+
+    raise TypeError(f'expected a string, but {type(s).__name__} found')
+
+def join(left: Rope, right: Rope) -> Rope:
+    """Concatenate two non-empty ropes. A short `right` is merged into the
+    last leaf of `left` where possible. Otherwise `right` is attached to the
+    right spine of `left` at the first subtree shallower than its sibling, as
+    in a binary counter, so that repeated appends keep the rope balanced.
+    Ropes that grow too deep in other ways are rebalanced."""
+    if right.flat is not None and right.length < SHORT_LENGTH:
+        spine = []
+        node = left
+
+        while isinstance(node, Concat) and node.flat is None:
+            spine.append(node)
+            node = node.right
+
+        if (node.flat is not None
+        and node.length + right.length <= LEAF_LENGTH):
+            return rebuild_spine(spine, Leaf(node.flat + right.flat))
+
+    spine = []
+    node = left
+
+    while (isinstance(node, Concat) and node.flat is None
+    and node.right.depth < node.left.depth):
+        spine.append(node)
+        node = node.right
+
+    rope = rebuild_spine(spine, Concat(node, right))
+
+    if rope.depth > MAX_DEPTH:
+        rope = rebalance(rope)
+
+    return rope
+
+def rebuild_spine(spine: t.List[Concat], node: Rope) -> Rope:
+    """Replace the right child of the last node of a right spine, copying
+    the nodes above it."""
+    for parent in reversed(spine):
+        node = Concat(parent.left, node)
+
+    return node
+
+def rebalance(rope: Rope) -> Rope:
+    """Rebuild the concatenations in a rope as a balanced tree over the same
+    pieces."""
+    pieces = []
+    stack = [rope]
+
+    while stack:
+        node = stack.pop()
+
+        if isinstance(node, Concat) and node.flat is None:
+            stack.append(node.right)
+            stack.append(node.left)
+        else:
+            pieces.append(node)
+
+    while len(pieces) > 1:
+        pieces = [
+            Concat(pieces[i], pieces[i + 1]) if i + 1 < len(pieces)
+            else pieces[i]
+            for i in range(0, len(pieces), 2)
+        ]
+
+    return pieces[0]
+
+def rope_concat(*strings: t.Union[Rope, str]) -> t.Union[Rope, str]:
+    result = ''
+
+    for s in strings:
+        if len(result) + len(s) < SHORT_LENGTH:
+            result = str(result) + str(s)
+        elif not result:
+            result = s
+        elif s:
+            result = join(as_rope(result), as_rope(s))
+
+    return result
+
+def rope_slice(s: t.Union[Rope, str], start: int, stop: t.Optional[int] = None)\
+-> t.Union[Rope, str]:
+    indices = range(len(s))[start:stop]
+    start = indices.start
+    stop = max(indices.start, indices.stop)
+
+    if stop - start < SHORT_LENGTH:
+        return ''.join(iter_chunks(as_rope(s), start, stop))
+
+    if isinstance(s, Slice):
+        return Slice(s.base, s.start + start, s.start + stop)
+
+    return Slice(as_rope(s), start, stop)
+
+def rope_length(s: t.Union[Rope, str]) -> int:
+    return len(s)
+
+def rope_find(s: t.Union[Rope, str], needle: t.Union[Rope, str],
+start: int = 0) -> int:
+    """Find the index of the first occurrence of `needle` at or after
+    `start`, or -1 if there is none. The string is searched a chunk at a time
+    rather than being flattened."""
+    needle = str(needle)
+
+    if start > len(s):
+        return -1
+
+    start = range(len(s))[start:].start
+    carry = ''
+    offset = start
+
+    for chunk in iter_chunks(as_rope(s), start, len(s)):
+        window = carry + chunk
+        index = window.find(needle)
+
+        if index >= 0:
+            return offset + index
+
+        keep = min(len(needle) - 1, len(window)) if needle else 0
+        carry = window[len(window) - keep:]
+        offset += len(window) - keep
+
+    return -1 if needle else start
+
+def rope_write_file(filename: t.Union[Rope, str], s: t.Union[Rope, str])\
+-> None:
+    """Write a string to a file a chunk at a time, without flattening it."""
+    with open(filename, 'w', encoding='utf-8') as f:
+        for chunk in iter_chunks(as_rope(s), 0, len(s)):
+            f.write(chunk)
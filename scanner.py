@@ -1,4 +1,6 @@
 import typing as t
+import mmap
+import re
 from functools import partial
 from fractions import Fraction
 from base import basedigit, Location, LispError
@@ -252,3 +254,264 @@ class Scanner:
             return partial(self.scan_lexeme,
                 fragment=fragment,
             )
+
+# A faster path for scanning whole files, which works directly on the bytes of
+# a memory-mapped UTF-8 file. Instead of feeding characters one at a time
+# through the `Scanner` states, it uses a regular expression to find the byte
+# offsets at which each lexeme and string literal begins and ends, and decodes
+# each slice only once.
+
+MAPPED_TOKEN_PATTERN = re.compile(rb'''
+    (?P<newline>\n)
+    | (?P<whitespace>[ \t\r\f\v]+)
+    | (?P<directive>[()])
+    | (?P<block_comment>;:)
+    | (?P<line_comment>;[^\n]*)
+    | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+    | (?P<unterminated_string>["'])
+    | (?P<lexeme>[^\s();'"][^\s()'"]*)
+''', re.VERBOSE | re.DOTALL)
+
+MAPPED_BLOCK_COMMENT_PATTERN = re.compile(rb'[:;\n]')
+
+class MappedSource:
+    """A UTF-8 buffer (such as an `mmap`) being scanned by `scan_buffer`. It
+    keeps track of the line containing the current scanning position, so that
+    byte offsets can be converted into `Location`s. On a line that isn't pure
+    ASCII, `col_offset` and `col` hold the byte offset and column of the last
+    location found, so that only the bytes since then need to be decoded to
+    find the column of the next one."""
+    filename: str
+    buf: t.Union[bytes, mmap.mmap]
+    line_number: int
+    line_start: int
+    line: t.Optional[str]
+    line_is_ascii: bool
+    col_offset: int
+    col: int
+
+    def __init__(self, filename: str, buf: t.Union[bytes, mmap.mmap])\
+    -> None:
+        self.filename = filename
+        self.buf = buf
+        self.line_number = 1
+        self.line_start = 0
+        self.line = None
+        self.line_is_ascii = True
+        self.col_offset = 0
+        self.col = 0
+
+    def newline(self, offset: int) -> None:
+        """Record that a new line begins at the given byte offset."""
+        self.line_number += 1
+        self.line_start = offset
+        self.line = None
+
+    def skip_lines(self, start: int, end: int) -> None:
+        """Record any line breaks between the given byte offsets."""
+        last_newline = self.buf.rfind(b'\n', start, end)
+
+        if last_newline >= 0:
+            self.line_number += self.buf[start:last_newline + 1].count(b'\n')
+            self.line_start = last_newline + 1
+            self.line = None
+
+    def location(self, offset: int) -> Location:
+        """Get the `Location` of a byte offset on the current line."""
+        if self.line is None:
+            line_end = self.buf.find(b'\n', self.line_start)
+
+            if line_end < 0:
+                line_end = len(self.buf)
+
+            line_bytes = self.buf[self.line_start:line_end]
+            self.line = line_bytes.decode('utf-8').rstrip('\r')
+            self.line_is_ascii = line_bytes.isascii()
+            self.col_offset = self.line_start
+            self.col = 0
+
+        if self.line_is_ascii:
+            return Location(self.filename, self.line_number, self.line,
+                offset - self.line_start)
+
+        if offset < self.col_offset:
+            self.col_offset = self.line_start
+            self.col = 0
+
+        self.col += len(self.buf[self.col_offset:offset].decode('utf-8'))
+        self.col_offset = offset
+        return Location(self.filename, self.line_number, self.line, self.col)
+
+    def location_within(self, start: int, offset: int) -> Location:
+        """Get the `Location` of a byte offset that may lie on a later line
+        than the one containing `start`. The current line is not changed."""
+        line_number = self.line_number
+        line_start = self.line_start
+        line = self.line
+        col_offset = self.col_offset
+        col = self.col
+        self.skip_lines(start, offset)
+
+        try:
+            return self.location(offset)
+        finally:
+            self.line_number = line_number
+            self.line_start = line_start
+            self.line = line
+            self.line_is_ascii = line is None or line.isascii()
+            self.col_offset = col_offset
+            self.col = col
+
+def skip_block_comment(source: MappedSource, start: int) -> int:
+    """Skip a block comment whose opening `;:` ends at the given byte offset,
+    returning the offset just after its closing `:;`. This follows the same
+    transitions as `Scanner.scan_block_comment`, but only visits the bytes that
+    can cause one."""
+    level = 0
+    state = 'block'
+    previous = start - 1
+
+    for match in MAPPED_BLOCK_COMMENT_PATTERN.finditer(source.buf, start):
+        offset = match.start()
+        c = match.group()
+
+        if offset != previous + 1:
+            state = 'block'
+
+        previous = offset
+
+        if c == b'\n':
+            source.newline(offset + 1)
+            state = 'block'
+        elif state == 'colon':
+            if c == b';':
+                if not level:
+                    return offset + 1
+
+                level -= 1
+
+            state = 'block'
+        elif state == 'semicolon':
+            if c == b':':
+                level += 1
+
+            state = 'block'
+        elif c == b':':
+            state = 'colon'
+        else:
+            state = 'semicolon'
+
+    return len(source.buf)
+
+def unescape_string(source: MappedSource, start: int, content: str) -> str:
+    """Replace the escape sequences in the decoded content of a string literal
+    whose content begins at the byte offset `start`. Only the characters of
+    the escape sequences themselves are examined individually."""
+    def error(msg: str, i: int) -> LispError:
+        offset = start + len(content[:i].encode('utf-8'))
+        return LispError(msg, source.location_within(start, offset))
+
+    parts = []
+    i = 0
+
+    while True:
+        j = content.find('\\', i)
+
+        if j < 0:
+            parts.append(content[i:])
+            return ''.join(parts)
+
+        parts.append(content[i:j])
+        c = content[j + 1]
+        i = j + 2
+
+        if c != '(':
+            try:
+                parts.append(Scanner.SIMPLE_ESCAPE_SEQUENCES[c])
+            except KeyError:
+                raise error('Invalid escape sequence', j + 1) from None
+
+            continue
+
+        code = 0
+
+        while i < len(content) and content[i].isdigit():
+            code = 10 * code + (ord(content[i]) - ord('0'))
+            i += 1
+
+        if i < len(content) and content[i] == '#':
+            base = code
+            code = 0
+            i += 1
+
+            while i < len(content):
+                try:
+                    digit = basedigit(content[i], base)
+                except ValueError:
+                    break
+
+                code = base * code + digit
+                i += 1
+
+            if i >= len(content) or content[i] != ')':
+                raise error('Invalid character in character code', i)
+        elif i >= len(content) or content[i] != ')':
+            raise error('Invalid character code', i)
+
+        parts.append(chr(code))
+        i += 1
+
+def scan_buffer(filename: str, buf: t.Union[bytes, mmap.mmap])\
+-> t.Iterator[ScannerYield]:
+    """Scan a complete UTF-8 buffer, such as an `mmap`, and yield the same
+    lexemes and tokens as `Scanner.scan` would. Whitespace is limited to ASCII
+    whitespace, and a string literal left open at the end of the buffer is an
+    error, since the buffer cannot be resumed."""
+    source = MappedSource(filename, buf)
+    pos = 0
+    end = len(buf)
+
+    while pos < end:
+        match = MAPPED_TOKEN_PATTERN.match(buf, pos)
+        kind = match.lastgroup
+        start = pos
+        pos = match.end()
+
+        if kind == 'newline':
+            source.newline(pos)
+        elif kind == 'lexeme':
+            yield Lexeme(source.location(start), match.group().decode('utf-8'))
+        elif kind == 'directive':
+            yield Token(
+                source.location(start),
+                ParserDirective(match.group().decode('ascii')),
+            )
+        elif kind == 'string':
+            location = source.location(start)
+            content = buf[start + 1:pos - 1].decode('utf-8')
+
+            if '\r' in content:
+                content = content.replace('\r\n', '\n').replace('\r', '\n')
+
+            if '\\' in content:
+                content = unescape_string(source, start + 1, content)
+
+            source.skip_lines(start, pos)
+            yield Token(location, content)
+        elif kind == 'block_comment':
+            pos = skip_block_comment(source, pos)
+        elif kind == 'unterminated_string':
+            raise LispError('Unterminated string literal',
+                source.location(start))
+
+def scan_mapped_file(filename: str) -> t.Iterator[ScannerYield]:
+    """Memory-map a UTF-8 source file and scan it with `scan_buffer`."""
+    with open(filename, 'rb') as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped.
+            return
+
+        with buf:
+            yield from scan_buffer(filename, buf)
@@ -0,0 +1,54 @@
+import typing as t
+from functools import reduce
+from itertools import islice
+
+class Sequence:
+    """A lazy sequence of values. Nothing is computed until the sequence is
+    iterated over, and each iteration starts afresh by calling
+    `make_iterator`, so a sequence can be consumed any number of times
+    without ever being held in memory as a whole."""
+    make_iterator: t.Callable[[], t.Iterator]
+
+    def __init__(self, make_iterator: t.Callable[[], t.Iterator]) -> None:
+        self.make_iterator = make_iterator
+
+    def __iter__(self) -> t.Iterator:
+        return self.make_iterator()
+
+    def __repr__(self) -> str:
+        return '<sequence>'
+
+def expand_sequences(args: t.Iterable) -> t.Iterator:
+    """Iterate over the arguments of a procedure, replacing each sequence
+    with its elements."""
+    for arg in args:
+        if isinstance(arg, Sequence):
+            yield from arg
+        else:
+            yield arg
+
+def seq_range(*args: int) -> Sequence:
+    return Sequence(lambda: iter(range(*args)))
+
+def seq_map(proc: t.Callable, *seqs: t.Iterable) -> Sequence:
+    return Sequence(lambda: map(proc, *seqs))
+
+def seq_filter(pred: t.Callable, seq: t.Iterable) -> Sequence:
+    return Sequence(lambda: filter(pred, seq))
+
+def seq_take(n: int, seq: t.Iterable) -> Sequence:
+    return Sequence(lambda: islice(seq, n))
+
+def seq_reduce(proc: t.Callable, seq: t.Iterable, *initial) -> t.Any:
+    return reduce(proc, seq, *initial)
+
+def seq_lines(filename: str) -> Sequence:
+    """A sequence of the lines of a text file, without their line endings.
+    The file is opened afresh each time the sequence is iterated over, and
+    closed once the iteration is finished."""
+    def iter_lines() -> t.Iterator[str]:
+        with open(filename, encoding='utf-8') as f:
+            for line in f:
+                yield line.rstrip('\n')
+
+    return Sequence(iter_lines)